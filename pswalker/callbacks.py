@@ -4,6 +4,7 @@ Specialized Callbacks for Skywalker
 ############
 # Standard #
 ############
+import math
 import logging
 import simplejson as sjson
 from pathlib import Path
@@ -12,7 +13,6 @@ from pathlib import Path
 # Third Party #
 ###############
 import lmfit
-import pandas as pd
 import numpy  as np
 from lmfit.models import LinearModel
 from bluesky.callbacks import (LiveFit, LiveFitPlot, CallbackBase, LivePlot)
@@ -59,27 +59,34 @@ def apply_filters(doc, filters=None, drop_missing=True):
     #Iterate through filters
     for key, func in filters.items(): 
         try:
-            
+            value = doc[key]
+
+            #Check floats without the overhead of a numpy ufunc
+            if isinstance(value, float):
+                if not math.isfinite(value):
+                    resp.append(not drop_missing)
+                    continue
+
             #Check iterables for nan and inf
-            if isiterable(doc[key]):
-                if any(np.isnan(doc[key])) or any(np.isinf(doc[key])):
+            elif isiterable(value):
+                if any(np.isnan(value)) or any(np.isinf(value)):
                     resp.append(not drop_missing)
                     continue
 
             #Check string entries for nan and inf
-            elif isinstance(doc[key], str):
-                if "inf" == doc[key].lower() or "nan" == doc[key].lower():
+            elif isinstance(value, str):
+                if "inf" == value.lower() or "nan" == value.lower():
                     resp.append(not drop_missing)
                     continue
 
             #Handle all other types
             else:
-                if np.isnan(doc[key]) or np.isinf(doc[key]):
+                if np.isnan(value) or np.isinf(value):
                     resp.append(not drop_missing)
                     continue
 
             #Evaluate filter
-            resp.append(bool(func(doc[key])))
+            resp.append(bool(func(value)))
             
         #Handle missing information
         except KeyError:
@@ -124,13 +131,13 @@ def rank_models(models, target, **kwargs):
         try:
             estimate = model.eval(**kwargs)
             diffs.append(np.abs(estimate-target))
-            logger.debug("Model {} predicted a value of {}"
-                         "".format(model.name, estimate))
+            logger.debug("Model %s predicted a value of %s",
+                         model.name, estimate)
         except RuntimeError as e:
             bad_models.append(model)
             diffs.append(np.inf)
-            logger.debug("Unable to yield estimate from model {}"
-                         "".format(model.name))
+            logger.debug("Unable to yield estimate from model %s",
+                         model.name)
             logger.debug(e)
     #Rank performances
     model_ranking = model_ranking[np.argsort(diffs)]
@@ -139,6 +146,34 @@ def rank_models(models, target, **kwargs):
             if model not in bad_models]
 
 
+def linear_least_squares(n, sx, sy, sxx, sxy):
+    """
+    Calculate the least squares line from the running sums of a dataset
+
+    Parameters
+    ----------
+    n : int
+        Number of points
+
+    sx, sy : float
+        Sums of the ``x`` and ``y`` values
+
+    sxx, sxy : float
+        Sums of ``x*x`` and ``x*y``
+
+    Returns
+    -------
+    line : tuple or None
+        Slope and intercept of the line, or None if the points do not
+        determine a unique line
+    """
+    denom = n*sxx - sx*sx
+    if n < 2 or not denom > 1e-12*n*sxx:
+        return None
+    slope = (n*sxy - sx*sy)/denom
+    return slope, (sy - slope*sx)/n
+
+
 class LiveBuild(LiveFit):
     """
     Base class for live model building in Skywalker
@@ -171,7 +206,9 @@ class LiveBuild(LiveFit):
         self.average      = average
         self.filters      = filters or {}
         self.drop_missing = drop_missing
-        self._avg_cache   = list()
+        #Preallocated buffer of fit fields for each shot in an average
+        self._avg_cache   = np.empty((average, len(self.field_names)))
+        self._avg_count   = 0
 
 
 
@@ -210,22 +247,28 @@ class LiveBuild(LiveFit):
         if not apply_filters(doc['data']):
             return
 
-        #Add doc to average cache
-        self._avg_cache.append(doc)
+        #Resize the cache if the averaging setting has changed
+        if len(self._avg_cache) != self.average:
+            self._avg_cache = np.empty((self.average, len(self.field_names)))
+            self._avg_count = 0
+
+        #Add fit fields to average cache
+        self._avg_cache[self._avg_count] = [doc['data'][key]
+                                            for key in self.field_names]
+        self._avg_count += 1
 
         #Check we have the right number of shots to average
-        if len(self._avg_cache) >= self.average:
+        if self._avg_count >= self.average:
             #Overwrite event number
             #This can be removed with an update to Bluesky Issue #684
             doc['seq_num'] = len(self.ydata) +1 
             #Rewrite document with averages
-            for key in self.field_names:
-                doc['data'][key] = np.mean([d['data'][key]
-                                            for d in self._avg_cache])
+            doc['data'].update(zip(self.field_names,
+                                   self._avg_cache.mean(axis=0)))
             #Send to callback
             super().event(doc)
             #Clear cache
-            self._avg_cache.clear()
+            self._avg_count = 0
 
 
     def eval(self, *args, **kwargs):
@@ -233,8 +276,8 @@ class LiveBuild(LiveFit):
         Estimate a point based on the current fit of the model.
         Reimplemented by subclasses
         """
-        logger.debug("Evaluating model {} with args : {}, kwargs {}"
-                     "".format(self.name, args, kwargs))
+        logger.debug("Evaluating model %s with args : %s, kwargs %s",
+                     self.name, args, kwargs)
         if not self.result:
             raise RuntimeError("Can not evaluate without a saved fit, "\
                                "use .update_fit()")
@@ -249,8 +292,8 @@ class LiveBuild(LiveFit):
             For multivariable functions the user may have to specify which
             variable to solve for, and which to keep fixed
         """
-        logger.debug("Backsolving model {} for target {} and kwargs {}"
-                     "".format(self.name, target, kwargs))
+        logger.debug("Backsolving model %s for target %s and kwargs %s",
+                     self.name, target, kwargs)
         if not self.result:
             raise RuntimeError("Can not backsolve without a saved fit, "\
                                "use .update_fit()")
@@ -299,6 +342,48 @@ class LinearFit(LiveBuild):
                          init_guess=init,
                          update_every=update_every,
                          average=average)
+        #Running sums of the data (n, Σx, Σy, Σxx, Σxy), with x taken
+        #relative to the first position to keep small steps precise
+        self._sums = [0, 0., 0., 0., 0.]
+        self._x0   = None
+
+
+    def start(self, doc):
+        #Clear running sums with the rest of the cached data
+        self._sums = [0, 0., 0., 0., 0.]
+        self._x0   = None
+        super().start(doc)
+
+
+    def update_caches(self, y, independent_vars):
+        #Fold the new point into the running sums
+        if self._x0 is None:
+            self._x0 = independent_vars['x']
+        x = independent_vars['x'] - self._x0
+        n, sx, sy, sxx, sxy = self._sums
+        self._sums = [n + 1, sx + x, sy + y, sxx + x*x, sxy + x*y]
+        super().update_caches(y, independent_vars)
+
+
+    def update_fit(self):
+        """
+        Seed the fit with the closed-form least squares solution calculated
+        from the running sums, so the minimizer starts at the optimum. The
+        configured ``init_guess`` is left untouched, and used as is when the
+        data does not determine a line
+        """
+        line = linear_least_squares(*self._sums)
+        if not line:
+            return super().update_fit()
+        #Shift the intercept back from the first position
+        slope, intercept = line[0], line[1] - line[0]*self._x0
+        #Swap in the seeded guess for this fit only
+        init_guess = self.init_guess
+        self.init_guess = dict(init_guess, slope=slope, intercept=intercept)
+        try:
+            super().update_fit()
+        finally:
+            self.init_guess = init_guess
 
 
     def eval(self, **kwargs):
@@ -333,12 +418,9 @@ class LinearFit(LiveBuild):
             raise ValueError("Must supply keyword `x` or use fieldname {}"
                              "".format(self.independent_vars['x']))
 
-        #Structure input add past result
-        kwargs = {'x' : np.asarray(x)}
-        kwargs.update(self.result.values)
-
-        #Return prediction
-        return self.result.model.eval(**kwargs)
+        #Evaluate the line directly rather than through lmfit
+        return (self.result.values['slope']*np.asarray(x)
+                + self.result.values['intercept'])
 
 
     def backsolve(self, target, **kwargs):
@@ -361,11 +443,17 @@ class LinearFit(LiveBuild):
         #Gather line information
         (m, b) = (self.result.values['slope'],
                   self.result.values['intercept'])
-        #Return x position
-        if m == 0 and b != target:
-            raise ValueError("Unable to backsolve, because fit is horizontal " 
-                             " after {} data points".format(len(self.ydata)))
+        #Check the data determine a slope, i.e the readings vary and the
+        #line accounts for more than a negligible part of that variation
+        x_spread = np.ptp(self.independent_vars_data['x'])
+        y_spread = np.ptp(self.ydata)
+        if (not np.isfinite(m) or not y_spread > 0
+                or not abs(m)*x_spread > 1e-3*y_spread):
+            raise ValueError("Unable to backsolve, because fit is horizontal "
+                             "or invalid after {} data points"
+                             "".format(len(self.ydata)))
 
+        #Return x position
         return {'x' : (target-b)/m}
 
 
@@ -147,7 +147,7 @@ def iterwalk(detectors, motors, goals, starts=None, first_steps=1,
     recoveries = 0
     # Set up end conditions
     n_steps = 0
-    start_time = time.time()
+    start_time = time.monotonic()
     models   = [None]* num
     finished = [False] * num
     done_pos = [0] * num
@@ -171,9 +171,10 @@ def iterwalk(detectors, motors, goals, starts=None, first_steps=1,
         while index < num:
             try:
                 # Before each walk, check the global timeout.
-                if timeout is not None and time.time() - start_time > timeout:
+                elapsed = time.monotonic() - start_time
+                if timeout is not None and elapsed > timeout:
                     raise RuntimeError("Iterwalk has timed out after %s s",
-                                       time.time() - start_time)
+                                       elapsed)
 
                 logger.debug("putting imager in")
                 ok = (yield from prep_img_motors(index, detectors, timeout=15))
@@ -395,7 +396,7 @@ def iterwalk(detectors, motors, goals, starts=None, first_steps=1,
     txt += 'Deltas are %s\n'
     txt += 'Mirror positions are %s'
     logger.info(txt,
-                time.time() - start_time,
+                time.monotonic() - start_time,
                 mirror_walks,
                 yag_cycles,
                 recoveries,
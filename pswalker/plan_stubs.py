@@ -52,7 +52,7 @@ def prep_img_motors(n_mot, img_motors, prev_out=True, tail_in=True,
     ok: bool
         True if the wait succeeded, False otherwise.
     """
-    start_time = time.time()
+    start_time = time.monotonic()
 
     prev_img_mot = str(uuid.uuid4())
     ok = True
@@ -78,7 +78,7 @@ def prep_img_motors(n_mot, img_motors, prev_out=True, tail_in=True,
         ok = False
 
     if ok and timeout is not None:
-        ok = time.time() - start_time < timeout
+        ok = time.monotonic() - start_time < timeout
 
     if ok:
         logger.debug("prep_img_motors completed successfully")
@@ -4,22 +4,24 @@ Bluesky Plans for the Walker
 ############
 # Standard #
 ############
+import math
 import time
 import itertools
 import logging
 from collections import Iterable
 from copy import copy
+from operator import itemgetter
 ###############
 # Third Party #
 ###############
 import numpy as np
-import pandas as pd
 import bluesky
-from scipy.stats   import linregress
 from ophyd import Device, Signal
+from ophyd.areadetector.plugins import ProcessPlugin
 from bluesky.utils import Msg
-from bluesky.plan_stubs import mv, rel_set, trigger_and_read
-from bluesky.preprocessors import run_decorator, stage_decorator
+from bluesky.plan_stubs import mv, rd, rel_set, trigger_and_read
+from bluesky.preprocessors import (run_decorator, stage_decorator,
+                                   finalize_wrapper)
 
 ##########
 # Module #
@@ -30,6 +32,9 @@ from .utils.exceptions import FilterCountError
 
 logger = logging.getLogger(__name__)
 
+#Pull the value out of a reading
+_get_value = itemgetter('value')
+
 def measure_average(detectors, num=1, filters=None,
                     delay=None, drop_missing=True):
     """
@@ -61,13 +66,22 @@ def measure_average(detectors, num=1, filters=None,
     data = yield from measure(detectors, num=num, delay=delay,
                               filters=filters, drop_missing=drop_missing)
 
-    #Gather keys
-    avg = dict.fromkeys(set([key for d in data for key in d.keys()]))
-    for key in avg.keys():
+    #Gather each field into a column in a single pass over the shots
+    columns = dict()
+    for d in data:
+        for key, value in d.items():
+            columns.setdefault(key, []).append(value)
+
+    avg = dict()
+    for key, values in columns.items():
+        #Use a compensated sum for scalar fields to avoid numpy overhead
         try:
-            avg[key] = np.mean([d[key] for d in data])
-        except TypeError:
-            avg[key] = data[-1][key]
+            avg[key] = math.fsum(values)/len(values)
+        except (TypeError, ValueError, OverflowError):
+            try:
+                avg[key] = np.mean(values)
+            except TypeError:
+                avg[key] = values[-1]
 
     logger.debug("Found the following averages: %s", avg)
     return avg
@@ -75,7 +89,7 @@ def measure_average(detectors, num=1, filters=None,
 
 def measure_centroid(det, target_field='centroid_x',
                      average=1, delay=None, filters=None,
-                     drop_missing=True):
+                     drop_missing=True, hw_average=False):
     """
     Measure the centroid of the beam over one or more images
 
@@ -92,14 +106,48 @@ def measure_centroid(det, target_field='centroid_x',
 
     delay : float, optional
         Time to wait inbetween images
+
+    hw_average : bool, optional
+        Acquire all of the images with a single trigger of the camera and
+        average them with the frame filter of the ``proc1`` ProcessPlugin,
+        so that the centroid is read once. The detector must have both a
+        ``cam`` and a ``proc1`` ProcessPlugin, which should feed the stats
+        plugin reporting ``target_field``. The camera and filter settings
+        are restored afterwards
     """
     logger.debug("Running measure_centroid.") 
+    target_field = field_prepend(target_field, det)
     #Use default filters
-    filters = filters or {field_prepend(target_field, det) : lambda x : x > 0}
-    #Take average measurement
-    avgs = yield from measure_average([det], num=average, delay=delay,
-                                       filters=filters, drop_missing=drop_missing)
-    return avgs[field_prepend(target_field, det)]
+    filters = filters or {target_field : lambda x : x > 0}
+    #Take measurements
+    plan = measure([det], num=1 if hw_average else average, delay=delay,
+                   filters=filters, drop_missing=drop_missing)
+    if hw_average:
+        detector = getattr(det, 'detector', det)
+        cam  = getattr(detector, 'cam', None)
+        proc = getattr(detector, 'proc1', None)
+        if cam is None or not isinstance(proc, ProcessPlugin):
+            raise ValueError("Hardware averaging requires a detector with a "
+                             "cam and a proc1 ProcessPlugin, which {} does "
+                             "not have".format(det.name))
+        #Take all of the images in a single acquisition and average them,
+        #only publishing the array once all of them are in
+        config = [(cam.num_images, average), (cam.image_mode, 1),
+                  (proc.enable_filter, 'Enable'),
+                  (proc.filter_type, 'Average'),
+                  (proc.num_filter, average),
+                  (proc.filter_callbacks, 'Array N only')]
+        #Read the current settings to restore afterwards
+        restore = list()
+        for (sig, _) in config:
+            restore.extend((sig, (yield from rd(sig))))
+        yield from mv(*[arg for setting in config for arg in setting])
+        #Clear frames taken before this measurement from the filter
+        yield from mv(proc.reset_filter, 1)
+        plan = finalize_wrapper(plan, mv(*restore))
+    data = yield from plan
+    #Only average the centroid, rather than every field of the detector
+    return math.fsum(d[target_field] for d in data)/len(data)
 
 
 def walk_to_pixel(detector, motor, target, filters=None,
@@ -192,8 +240,8 @@ def walk_to_pixel(detector, motor, target, filters=None,
         init_guess = {'slope' : gradient}
         #Take a quick measurement
         def gradient_step():
-            logger.debug("Using gradient of {} for naive step..."
-                        "".format(gradient))
+            logger.debug("Using gradient of %s for naive step...",
+                         gradient)
             #Take a quick measurement 
             avgs = yield from measure_average([detector, motor] + system,
                                                filters=filters,
@@ -205,8 +253,8 @@ def walk_to_pixel(detector, motor, target, filters=None,
             intercept = center - gradient*pos
             #Calculate best step on first guess of line
             next_pos = (target - intercept)/gradient
-            logger.debug("Predicting position using line y = {}*x + {}"
-                         "".format(gradient, intercept))
+            logger.debug("Predicting position using line y = %s*x + %s",
+                         gradient, intercept)
             #Move to position
             yield from mv(motor, next_pos)
 
@@ -268,10 +316,9 @@ def measure(detectors, num=1, delay=None, filters=None, drop_missing=True,
     """
     #Log setup
     logger.debug("Running measure")
-    logger.debug("Arguments passed: detectors: {0}, "\
-                 "num: {1}, delay: {2}, drop_missing: {3}"\
-                 "".format([d.name for d in detectors],
-                           num, delay,drop_missing))
+    logger.debug("Arguments passed: detectors: %s, "\
+                 "num: %s, delay: %s, drop_missing: %s",
+                 [d.name for d in detectors], num, delay, drop_missing)
 
     #If scalable, repeat forever
     if not isinstance(delay, Iterable):
@@ -299,6 +346,13 @@ def measure(detectors, num=1, delay=None, filters=None, drop_missing=True,
         #Ensure it is an iterable
         delay = iter(delay)
 
+    #Messages are immutable, so build them once and reuse for every shot
+    trigger_msgs = [Msg('trigger', det, group='B') for det in detectors]
+    read_msgs    = [Msg('read', det) for det in detectors]
+    wait_msg     = Msg('wait',   None, 'B')
+    create_msg   = Msg('create', None, name='primary')
+    save_msg     = Msg('save')
+
     #Gather shots
     logger.debug("Gathering shots..")
     shots   = 0
@@ -308,26 +362,26 @@ def measure(detectors, num=1, delay=None, filters=None, drop_missing=True,
     #Gather fixed number of shots
     while shots < num:
         #Timestamp earliest possible moment
-        now = time.time()
+        now = time.monotonic()
 
         #Trigger detector and wait for completion
-        for det in detectors:
-            yield Msg('trigger', det, group='B')
+        for msg in trigger_msgs:
+            yield msg
 
         #Wait for completion and start bundling
-        yield Msg('wait',   None, 'B')
-        yield Msg('create', None, name='primary')
+        yield wait_msg
+        yield create_msg
 
         #Mock-event document
         det_reads = dict()
 
         #Gather shots
-        for det in detectors:
-            cur_det = yield Msg('read', det)
-            det_reads.update(dict([(k,v['value'])
-                             for k,v in cur_det.items()]))
+        for msg in read_msgs:
+            cur_det = yield msg
+            det_reads.update(zip(cur_det.keys(),
+                                 map(_get_value, cur_det.values())))
         #Emit Event doc to callbacks
-        yield Msg('save')
+        yield save_msg
 
         #Apply filters
         unfiltered = apply_filters(det_reads, filters=filters, drop_missing=drop_missing)
@@ -356,7 +410,7 @@ def measure(detectors, num=1, delay=None, filters=None, drop_missing=True,
 
             #If we have a delay, sleep
             if d is not None:
-                d = d - (time.time() - now)
+                d = d - (time.monotonic() - now)
                 if d > 0:
                     yield Msg('sleep', None, d)
 
@@ -373,9 +427,8 @@ def measure(detectors, num=1, delay=None, filters=None, drop_missing=True,
                           'bad values were %s'), dropped_dict)
             raise FilterCountError
     #Report finished
-    logger.debug("Finished taking {} measurements, "\
-                 "filters removed {} events"\
-                 "".format(len(data), dropped))
+    logger.debug("Finished taking %s measurements, "\
+                 "filters removed %s events", len(data), dropped)
 
     return data
 
@@ -476,32 +529,34 @@ def fitwalk(detectors, motor, models, target,
                                          filters=filters)
         #Save current target position
         last_shot = avg.pop(target_field)
-        logger.debug("Averaged data yielded {} is at {}"
-                     "".format(target_field, last_shot))
+        logger.debug("Averaged data yielded %s is at %s",
+                     target_field, last_shot)
+        return avg, last_shot
 
+    #Model selection method
+    def best_model():
         #Rank models based on accuracy of fit
-        model_ranking = rank_models(models, last_shot, **avg)
+        model_ranking = rank_models(models, last_shot, **averaged_data)
 
         #Determine if any models are accurate enough
         if len(model_ranking):
-            model = model_ranking[0]
+            return model_ranking[0]
 
-        else:
-            model = None
-
-        return avg, last_shot, model
+        return None
 
     #Make first measurements
-    averaged_data, last_shot, accurate_model = yield from model_measure()
-    #Begin walk
-    while not np.isclose(last_shot, target, atol=tolerance):
+    accurate_model = None
+    averaged_data, last_shot = yield from model_measure()
+    #Begin walk, written so that a NaN reading does not count as converged.
+    #Models are only ranked once we have stepped and still need a prediction
+    while not abs(last_shot - target) <= tolerance:
         #Log error
         if not steps:
-            logger.debug("Initial error before fitwalk is {}"
-                         "".format(int(target-last_shot)))
+            logger.debug("Initial error before fitwalk is %d",
+                         target-last_shot)
         else:
-            logger.debug("fitwalk is reporting an error {} of after step #{}"\
-                         "".format(int(target-last_shot), steps))
+            logger.debug("fitwalk is reporting an error %d of after step #%s",
+                         target-last_shot, steps)
         #Break on maximum step count
         if max_steps and steps >= max_steps:
             raise RuntimeError("fitwalk failed to converge after {} steps"\
@@ -509,13 +564,16 @@ def fitwalk(detectors, motor, models, target,
 
         #Use naive step plan if no model is accurate enough
         #or we have not made a step yet
-        if not accurate_model or steps==0:
+        if steps:
+            accurate_model = best_model()
+
+        if not accurate_model:
             logger.debug("No model yielded accurate prediction, "\
                          "using naive plan")
             yield from naive_step()
         else:
-            logger.debug("Using model {} to determine next step."\
-                        "".format(accurate_model.name))
+            logger.debug("Using model %s to determine next step.",
+                         accurate_model.name)
             #Calculate estimate of next step from accurate model
             fixed_motors = dict((key, averaged_data[key])
                                  for key in field_names
@@ -539,23 +597,27 @@ def fitwalk(detectors, motor, models, target,
                 #Move system to match estimate
                 for param, pos in estimates.items():
                     #Watch for NaN
-                    if pd.isnull(pos) or np.isinf(pos):
+                    if not np.isfinite(pos):
                         raise RuntimeError("Invalid position return by fit")
                     #Attempt to move
                     try:
-                        logger.debug("Adjusting motor {} to position {:.1f}"\
-                                     "".format(motor.name, pos))
+                        logger.debug("Adjusting motor %s to position %.1f",
+                                     motor.name, pos)
                         yield from mv(motor, pos)
 
                     except KeyboardInterrupt as e:
-                        logger.debug("No motor found to adjust variable {}"\
-                                     "".format(e))
+                        logger.debug("No motor found to adjust variable %s",
+                                     e)
         #Count our steps
         steps += 1
 
         #Take a new measurement
         logger.debug("Resampling after successfull move")
-        averaged_data, last_shot, accurate_model = yield from model_measure()
+        averaged_data, last_shot = yield from model_measure()
+
+    #Report the most accurate model if we had to step to the target
+    if steps:
+        accurate_model = best_model()
 
     #Report a succesfull run
     logger.info("Succesfully walked to value {} (target={}) after {} steps."\
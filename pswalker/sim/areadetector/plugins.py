@@ -279,3 +279,52 @@ class ImagePlugin(PluginBase, plugins.ImagePlugin):
 
     def _image(self):
         return np.zeros((256, 256))
+
+
+class ProcessPlugin(PluginBase, plugins.ProcessPlugin):
+    """
+    ProcessPlugin with all of the components instantiated to be empty signals.
+    """
+    plugin_type = Component(FakeSignal, value='NDPluginProcess')
+    auto_offset_scale = Component(FakeSignal, value='Disable')
+    auto_reset_filter = Component(FakeSignal, value='Disable')
+    average_seq = Component(FakeSignal, value=0)
+    copy_to_filter_seq = Component(FakeSignal, value=0)
+    data_type_out = Component(FakeSignal, value='Automatic')
+    difference_seq = Component(FakeSignal, value=0)
+    enable_background = Component(FakeSignal, value='Disable')
+    enable_filter = Component(FakeSignal, value='Disable')
+    enable_flat_field = Component(FakeSignal, value='Disable')
+    enable_high_clip = Component(FakeSignal, value='Disable')
+    enable_low_clip = Component(FakeSignal, value='Disable')
+    enable_offset_scale = Component(FakeSignal, value='Disable')
+    fc = DynamicDeviceComponent(ad_group(
+        FakeSignal, (('fc1'), ('fc2'), ('fc3'), ('fc4')), value=0))
+    filter_callbacks = Component(FakeSignal, value='Every array')
+    filter_type = Component(FakeSignal, value='RecursiveAve')
+    filter_type_seq = Component(FakeSignal, value=0)
+    foffset = Component(FakeSignal, value=0)
+    fscale = Component(FakeSignal, value=0)
+    high_clip = Component(FakeSignal, value=0)
+    low_clip = Component(FakeSignal, value=0)
+    num_filter = Component(FakeSignal, value=1)
+    num_filter_recip = Component(FakeSignal, value=0)
+    num_filtered = Component(FakeSignal, value=0)
+    o_offset = Component(FakeSignal, value=0)
+    o_scale = Component(FakeSignal, value=0)
+    oc = DynamicDeviceComponent(ad_group(
+        FakeSignal, (('oc1'), ('oc2'), ('oc3'), ('oc4')), value=0))
+    offset = Component(FakeSignal, value=0)
+    rc = DynamicDeviceComponent(ad_group(
+        FakeSignal, (('rc1'), ('rc2')), value=0))
+    recursive_ave_diff_seq = Component(FakeSignal, value=0)
+    recursive_ave_seq = Component(FakeSignal, value=0)
+    reset_filter = Component(FakeSignal, value=0)
+    roffset = Component(FakeSignal, value=0)
+    save_background = Component(FakeSignal, value=0)
+    save_flat_field = Component(FakeSignal, value=0)
+    scale = Component(FakeSignal, value=0)
+    scale_flat_field = Component(FakeSignal, value=0)
+    sum_seq = Component(FakeSignal, value=0)
+    valid_background = Component(FakeSignal, value='Invalid')
+    valid_flat_field = Component(FakeSignal, value='Invalid')
@@ -6,7 +6,8 @@ from ophyd import Device, Component, FormattedComponent
 
 from .sim import SimDevice
 from .signal import FakeSignal
-from .areadetector.plugins import (StatsPlugin, ImagePlugin)
+from .areadetector.plugins import (StatsPlugin, ImagePlugin,
+                                   ProcessPlugin)
 from .areadetector.detectors import PulnixDetector
 
 
@@ -15,6 +16,7 @@ class PIMPulnixDetector(PulnixDetector):
     image2 = Component(ImagePlugin, ":IMAGE2:", read_attrs=['array_data'])
     stats2 = Component(StatsPlugin, ":Stats2:", read_attrs=['centroid',
                                                             'mean_value'])
+    proc1 = Component(ProcessPlugin, ":Proc1:", read_attrs=[])
 
     image = SimpleNamespace(shape=[480, 620])
 
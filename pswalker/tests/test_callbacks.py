@@ -1,26 +1,24 @@
 import logging
 
+import pytest
 import numpy as np
 import pandas as pd
 from ophyd.sim import SynSignal, SynAxis
-from bluesky import RunEngine
 from bluesky.plans import outer_product_scan, scan
 
 from pswalker.callbacks import (rank_models, apply_filters, LinearFit,
-                                MultiPitchFit)
+                                MultiPitchFit, linear_least_squares)
 
 logger = logging.getLogger(__name__)
 
 
-def test_linear_fit():
-    RE = RunEngine()
-
+def test_linear_fit(RE):
     # Expected values of fit
     expected = {'slope': 5, 'intercept': 2}
 
     motor = SynAxis(name='motor')
     det = SynSignal(name='centroid',
-                    func=lambda: 5*motor.read()['motor']['value'] + 2)
+                    func=lambda: 5*motor.position + 2)
 
     # Assemble fitting callback
     cb = LinearFit('centroid', 'motor',
@@ -38,18 +36,120 @@ def test_linear_fit():
     assert np.allclose(cb.backsolve(52)['x'], 10, atol=1e-5)
 
 
-def test_multi_fit():
-    RE = RunEngine()
+def test_linear_fit_running_sums(RE):
+    motor = SynAxis(name='motor')
+    line = {'slope': 5, 'intercept': 2}
+    det = SynSignal(name='centroid',
+                    func=lambda: line['slope']*motor.position
+                                 + line['intercept'])
+    cb = LinearFit('centroid', 'motor', init_guess={'slope': 3})
+
+    # Sums are reset at the start of each run
+    for slope in (5, -4):
+        line['slope'] = slope
+        RE(scan([det], motor, -1e-6, 1e-6, 2), cb)
+        assert np.allclose(cb.result.values['slope'], slope, atol=1e-6)
+        assert np.allclose(cb.result.values['intercept'], 2, atol=1e-6)
+        assert np.allclose(cb.backsolve(10*slope + 2)['x'], 10, atol=1e-5)
+        # Configured guess is not replaced by the seed
+        assert cb.init_guess == {'slope': 3, 'intercept': 0}
+
+
+def test_linear_fit_average(RE):
+    motor = SynAxis(name='motor')
+    det = SynSignal(name='centroid',
+                    func=lambda: 5*motor.position + 2)
+    cb = LinearFit('centroid', 'motor', update_every=None, average=2)
+
+    # Consecutive pairs of shots are averaged into a single point
+    RE(scan([det], motor, -1, 1, 4), cb)
+    x = np.linspace(-1, 1, 4).reshape(-1, 2).mean(axis=1)
+    assert np.allclose(cb.independent_vars_data['x'], x)
+    assert np.allclose(cb.ydata, 5*x + 2)
+
+    # Changing the number of shots resizes the cache for the next run
+    cb.average = 4
+    RE(scan([det], motor, -1, 1, 8), cb)
+    x = np.linspace(-1, 1, 8).reshape(-1, 4).mean(axis=1)
+    assert cb._avg_cache.shape == (4, 2)
+    assert np.allclose(cb.independent_vars_data['x'], x)
+    assert np.allclose(cb.ydata, 5*x + 2)
+    assert np.allclose(cb.backsolve(52)['x'], 10, atol=1e-5)
+
+
+def running_sums(x, y):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return len(x), x.sum(), y.sum(), (x*x).sum(), (x*y).sum()
+
+
+def test_linear_least_squares():
+    # Exact line
+    x = np.array([-2., 0.5, 3., 7.])
+    assert np.allclose(linear_least_squares(*running_sums(x, 4*x - 1)), (4, -1))
+
+    # Best fit through scattered points
+    y = np.array([1., -2., 5., 3.])
+    assert np.allclose(linear_least_squares(*running_sums(x, y)),
+                       np.polyfit(x, y, 1))
+
+    # Too few points or no spread in x do not determine a line
+    assert linear_least_squares(*running_sums([], [])) is None
+    assert linear_least_squares(*running_sums([1.], [2.])) is None
+    assert linear_least_squares(*running_sums([3., 3., 3.], [1., 2., 3.])) is None
+
+
+def test_linear_fit_seed(RE):
+    motor = SynAxis(name='motor')
+    det = SynSignal(name='centroid',
+                    func=lambda: 5*motor.position + 2 + motor.position**2)
+    cb = LinearFit('centroid', 'motor', update_every=None)
+
+    # More than two points are seeded from the running sums
+    RE(scan([det], motor, -1, 1, 5), cb)
+    x = np.linspace(-1, 1, 5)
+    slope, intercept = np.polyfit(x, 5*x + 2 + x**2, 1)
+    assert np.allclose([cb.result.values['slope'],
+                        cb.result.values['intercept']], (slope, intercept))
+
+
+def test_linear_fit_small_steps(RE):
+    motor = SynAxis(name='motor')
+    det = SynSignal(name='centroid', func=lambda: 5*motor.position + 2)
+    cb = LinearFit('centroid', 'motor')
+
+    # Small steps far from zero are still seeded exactly
+    for num in (2, 3, 5):
+        RE(scan([det], motor, 1400, 1400 + 2e-8, num), cb)
+        assert np.allclose(cb.result.values['slope'], 5, atol=1e-3)
 
+
+def test_linear_fit_horizontal(RE):
+    motor = SynAxis(name='motor')
+    det = SynSignal(name='centroid', func=lambda: 2)
+    cb = LinearFit('centroid', 'motor', update_every=None)
+    RE(scan([det], motor, -1, 1, 10), cb)
+
+    # A flat fit can not be used to pick a step
+    with pytest.raises(ValueError):
+        cb.backsolve(2)
+
+    # Identical readings over small steps far from zero leave only noise in
+    # the fitted slope, which must not be used either
+    det = SynSignal(name='centroid', func=lambda: 320)
+    RE(scan([det], motor, 1400, 1400.0002, 3), cb)
+    assert len(cb.ydata) == 3
+    with pytest.raises(ValueError):
+        cb.backsolve(0)
+
+
+def test_multi_fit(RE):
     # Expected values of fit
     expected = {'x0': 5, 'x1': 4, 'x2': 3}
 
     m1 = SynAxis(name='m1')
     m2 = SynAxis(name='m2')
     det = SynSignal(name='centroid',
-                    func=lambda: 5
-                         + 4*m1.read()['m1']['value']
-                         + 3*m2.read()['m2']['value'])
+                    func=lambda: 5 + 4*m1.position + 3*m2.position)
 
     # Assemble fitting callback
     cb = MultiPitchFit('centroid', ('m1', 'm2'),
@@ -123,27 +223,25 @@ def test_apply_filters_correctness():
                          drop_missing=False)
 
 
-def test_rank_models():
-    RE = RunEngine()
-
+def test_rank_models(RE):
     # Create accurate fit
     motor = SynAxis(name='motor')
     det = SynSignal(name='centroid',
-                    func=lambda: 5*motor.read()['motor']['value'] + 2)
+                    func=lambda: 5*motor.position + 2)
     fit1 = LinearFit('centroid', 'motor',
                      update_every=None, name='Accurate')
     RE(scan([det], motor, -1, 1, 50), fit1)
 
     # Create inaccurate fit
     det2 = SynSignal(name='centroid',
-                     func=lambda: 25*motor.read()['motor']['value'] + 2)
+                     func=lambda: 25*motor.position + 2)
     fit2 = LinearFit('centroid', 'motor',
                      update_every=None, name='Inaccurate')
     RE(scan([det2], motor, -1, 1, 50), fit2)
 
     # Create inaccurate fit
     det3 = SynSignal(name='centroid',
-                     func=lambda: 12*motor.read()['motor']['value'] + 2)
+                     func=lambda: 12*motor.position + 2)
     fit3 = LinearFit('centroid', 'motor',
                      update_every=None, name='Midly Inaccurate')
     RE(scan([det3], motor, -1, 1, 50), fit3)
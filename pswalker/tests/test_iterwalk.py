@@ -23,7 +23,10 @@ tmo = 10
 @pytest.mark.timeout(tmo)
 @pytest.mark.parametrize("goal1", [-300, 0, 300])
 @pytest.mark.parametrize("goal2", [-300, 0, 300])
-@pytest.mark.parametrize("first_steps", [1e-4])
+# The simulated centroid is quantized to whole pixels, about one per urad
+# of pitch. A first step well below that leaves every reading identical
+# and gives the fit no slope to work from
+@pytest.mark.parametrize("first_steps", [1])
 @pytest.mark.parametrize("gradients", [None])
 @pytest.mark.parametrize("tolerances", [3])
 @pytest.mark.parametrize("overshoot", [0])
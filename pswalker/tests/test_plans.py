@@ -10,6 +10,7 @@ import lmfit
 import pytest
 import numpy as np
 from ophyd.sim import SynSignal, SynAxis, motor, det
+from bluesky.plan_stubs import mv
 from bluesky.preprocessors import run_wrapper
 
 ##########
@@ -17,7 +18,8 @@ from bluesky.preprocessors import run_wrapper
 ##########
 from pswalker.plans import measure, measure_average, measure_centroid
 from pswalker.plans import walk_to_pixel, fitwalk
-from pswalker.callbacks import LiveBuild, LinearFit
+from pswalker.callbacks import LiveBuild, LinearFit, rank_models
+from pswalker.sim.areadetector.detectors import SimDetector
 from pswalker.utils.exceptions import FilterCountError
 from .utils import collector
 
@@ -140,6 +142,52 @@ def test_measure_centroid(RE, one_bounce_system):
     assert centroids == [250., 250., 250., 250., 250.]
 
 
+def test_measure_centroid_hw_average(RE, one_bounce_system):
+    logger.debug("test_measure_centroid_hw_average")
+
+    _, mot, det = one_bounce_system
+    cam = det.detector.cam
+    proc = det.detector.proc1
+    cam.num_images.put(1)
+    cam.image_mode.put(2)
+    centroids = []
+    key_ext = 'detector_stats2_centroid_x'
+    col_c = collector(det.name + "_" + key_ext, centroids)
+
+    RE(run_wrapper(measure_centroid(det, average=5, target_field=key_ext,
+                                    hw_average=True)),
+       {'event': [col_c]})
+    # A single read is made of the averaged images
+    assert centroids == [250.]
+
+    # Camera and frame filter are configured before the trigger
+    msgs = RE.msg_hook.msgs
+    first_trigger = [msg.command for msg in msgs].index('trigger')
+    sets = [(msg.obj, msg.args[0]) for msg in msgs[:first_trigger]
+            if msg.command == 'set']
+    assert dict(sets[:-1]) == {cam.num_images: 5, cam.image_mode: 1,
+                               proc.enable_filter: 'Enable',
+                               proc.filter_type: 'Average',
+                               proc.num_filter: 5,
+                               proc.filter_callbacks: 'Array N only'}
+    # The filter is then reset so only new frames are averaged
+    assert sets[-1] == (proc.reset_filter, 1)
+
+    # Settings are restored afterwards
+    assert cam.num_images.get() == 1
+    assert cam.image_mode.get() == 2
+    assert proc.enable_filter.get() == 'Disable'
+    assert proc.filter_type.get() == 'RecursiveAve'
+    assert proc.num_filter.get() == 1
+    assert proc.filter_callbacks.get() == 'Every array'
+
+    # Detectors that can not average frames are refused
+    for no_avg in (det.detector.stats2, SimDetector('sim', name='sim')):
+        with pytest.raises(ValueError):
+            RE(run_wrapper(measure_centroid(no_avg, average=5,
+                                            hw_average=True)))
+
+
 def test_walk_to_pixel(RE, one_bounce_system):
     logger.debug("test_walk_to_pixel")
     _, mot, det = one_bounce_system
@@ -181,7 +229,7 @@ def test_walk_to_pixel(RE, one_bounce_system):
     ##########################
     # Naive step
     cent = 'detector_stats2_centroid_x'
-    plan = run_wrapper(walk_to_pixel(det, mot, 200, 0, first_step=1e-6,
+    plan = run_wrapper(walk_to_pixel(det, mot, 200, 0, first_step=1,
                                      tolerance=10, average=None,
                                      target_fields=[cent, 'sim_alpha'],
                                      max_steps=3))
@@ -191,7 +239,7 @@ def test_walk_to_pixel(RE, one_bounce_system):
     mot.set(0.)
 
     # Gradient
-    plan = run_wrapper(walk_to_pixel(det, mot, 200, 0, gradient=1.6842e+06,
+    plan = run_wrapper(walk_to_pixel(det, mot, 200, 0, gradient=1.6842,
                                      tolerance=10, average=None,
                                      target_fields=[cent, 'sim_alpha'],
                                      max_steps=3))
@@ -255,3 +303,43 @@ def test_fitwalk(RE):
     RE(run_wrapper(walk))
 
     assert np.isclose(det.read()['centroid']['value'], 89.4, 0.5)
+
+
+def test_fitwalk_on_target(RE, monkeypatch):
+    # Record every ranking of the models
+    ranked = list()
+    def record_ranking(models, target, **kwargs):
+        ranking = rank_models(models, target, **kwargs)
+        ranked.append((target, ranking))
+        return ranking
+    monkeypatch.setattr('pswalker.plans.rank_models', record_ranking)
+
+    # Create simulated devices already at the target
+    motor = SynAxis(name='motor')
+    det = SynSignal(name='centroid',
+                    func=lambda: 5*motor.read()['motor']['value'] + 2)
+
+    linear = LinearFit('centroid', 'motor', average=1)
+    results = list()
+    def walk(target, **kwargs):
+        results.append((yield from fitwalk([det], motor, [linear], target,
+                                           average=1, tolerance=0.5,
+                                           **kwargs)))
+    RE(run_wrapper(walk(2)))
+    last_shot, model = results[-1]
+
+    # No step is taken and the models are never ranked
+    assert last_shot == 2
+    assert model is None
+    assert not [msg for msg in RE.msg_hook.msgs if msg.command == 'set']
+    assert not ranked
+
+    # A walk that steps returns the model ranked on the final measurement
+    def naive_step():
+        return (yield from mv(motor, 1))
+    RE(run_wrapper(walk(12, naive_step=naive_step)))
+    last_shot, model = results[-1]
+    assert np.isclose(last_shot, 12)
+    assert ranked[-1][0] == last_shot
+    assert model is linear
+    assert model is ranked[-1][1][0]